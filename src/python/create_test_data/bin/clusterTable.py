@@ -0,0 +1,172 @@
+#! /software/bin/python
+
+#
+# Copyright (c) 2026 Genome Research Ltd. All rights reserved.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+# per-probe cluster model for fake .sim intensity data
+
+# each probe has its own alleles, and its own (x,y) centre and spread for each
+# of the AA, AB and BB clusters; the no-call cluster is noise around the origin
+# parameters are held in contiguous (probes, 4) arrays, indexed by genotype code
+# as in simGenerator (0 = no call, 1 = AA/XX, 2 = AB/XY, 3 = BB/YY), so that
+# intensities for a whole sample are one gather and one vector draw
+
+# a table is either generated at random from a seed, or read from a
+# tab-delimited text file (one probe per line, as written by writeTable)
+# probe names are taken from the manifest if available, otherwise probeNNNNNNN
+
+import array, math
+import numpy
+
+class clusterTable:
+
+    GENOTYPES = 4
+    HEADER = ['name', 'alleleA', 'alleleB',
+              'meanX_AA', 'meanY_AA', 'sd_AA',
+              'meanX_AB', 'meanY_AB', 'sd_AB',
+              'meanX_BB', 'meanY_BB', 'sd_BB']
+
+    def __init__(self, noiseMean=0, noiseSD=0.1):
+        self.noiseMean = noiseMean
+        self.noiseSD = noiseSD
+        self.alleleA = array.array('c')
+        self.alleleB = array.array('c')
+        self.names = []
+        self.meanX = numpy.zeros((0, self.GENOTYPES), numpy.float32)
+        self.meanY = numpy.zeros((0, self.GENOTYPES), numpy.float32)
+        self.sd = numpy.zeros((0, self.GENOTYPES), numpy.float32)
+
+    def __len__(self):
+        return len(self.alleleA)
+
+    def allocate(self, probes):
+        # create empty arrays, with no-call cluster set from noise parameters
+        shape = (probes, self.GENOTYPES)
+        self.meanX = numpy.zeros(shape, numpy.float32)
+        self.meanY = numpy.zeros(shape, numpy.float32)
+        self.sd = numpy.zeros(shape, numpy.float32)
+        self.meanX[:,0] = self.noiseMean
+        self.meanY[:,0] = self.noiseMean
+        self.sd[:,0] = self.noiseSD
+
+    def generateTable(self, alleles, seed=None, signalMean=1, signalSD=0.25,
+                      hetSD=0.08, bleedSD=0.05, spreadSD=0.5, names=None):
+        # generate random cluster parameters for given list of (alleleA, alleleB)
+        # names = optional list of probe names, eg. from manifest
+        # * overall signal magnitude per probe ~ N(signalMean, signalSD)
+        # * angle of AB cluster ~ N(pi/4, hetSD*pi/2), AA/BB close to the axes
+        # * spread of each cluster is lognormal around noiseSD
+        probes = len(alleles)
+        if names != None and len(names) != probes:
+            raise ValueError("Probe names do not match allele total")
+        rng = numpy.random.RandomState(seed)
+        self.allocate(probes)
+        self.alleleA = array.array('c', [a for (a, b) in alleles])
+        self.alleleB = array.array('c', [b for (a, b) in alleles])
+        if names != None: self.names = list(names)
+        else: self.names = []
+        signal = rng.normal(signalMean, signalSD, probes)
+        signal = numpy.maximum(signal, 0.2*signalMean)
+        het = numpy.clip(rng.normal(0.5, hetSD, probes), 0.2, 0.8)
+        bleed = numpy.abs(rng.normal(0, bleedSD, (probes, 2)))
+        angles = numpy.column_stack((bleed[:,0], het, 1-bleed[:,1]))*math.pi/2
+        scale = rng.normal(1, 0.1, (probes, 3))
+        radius = signal[:,numpy.newaxis]*numpy.maximum(scale, 0.5)
+        self.meanX[:,1:] = radius*numpy.cos(angles)
+        self.meanY[:,1:] = radius*numpy.sin(angles)
+        self.sd[:,1:] = self.noiseSD*rng.lognormal(0, spreadSD, (probes, 3))
+
+    def getAlleles(self, i):
+        return (self.alleleA[i], self.alleleB[i])
+
+    def getName(self, i):
+        if len(self.names) > 0: return self.names[i]
+        else: return 'probe'+str(i+1).zfill(7)
+
+    def getIntensities(self, genotypes, rng=numpy.random, noCallNoise=0.2):
+        # generate interleaved (x,y) intensities for one sample
+        # genotypes = integer array of genotype codes, one per probe
+        probes = len(genotypes)
+        flat = numpy.arange(probes)*self.GENOTYPES + genotypes
+        mean = numpy.empty((probes, 2), numpy.float32)
+        mean[:,0] = self.meanX.take(flat)
+        mean[:,1] = self.meanY.take(flat)
+        sd = self.sd.take(flat)
+        xy = numpy.abs(mean + sd[:,numpy.newaxis]*rng.standard_normal((probes, 2)))
+        # some no calls are nothing but completely uniform noise
+        uniform = (genotypes == 0) & (rng.random_sample(probes) < noCallNoise)
+        total = numpy.count_nonzero(uniform)
+        if total > 0: xy[uniform] = rng.uniform(0, 2, (total, 2))
+        return xy.astype(numpy.float32).ravel()
+
+    def readTable(self, inPath, probes=None):
+        # read table in format written by writeTable, one line at a time
+        # if probes is given, raise an error if the table has a different total
+        inFile = open(inPath, 'r')
+        header = inFile.readline().split()
+        if header != self.HEADER:
+            inFile.close()
+            raise ValueError("Incorrect cluster table header: "+inPath)
+        names = []
+        alleleA = array.array('c')
+        alleleB = array.array('c')
+        params = array.array('f')
+        lineNum = 1
+        for line in inFile:
+            lineNum += 1
+            words = line.split()
+            if len(words) == 0: continue
+            if len(words) != len(self.HEADER):
+                inFile.close()
+                raise ValueError("Expected "+str(len(self.HEADER))+\
+                                     " fields, found "+str(len(words))+\
+                                     ", at line "+str(lineNum)+" of "+inPath)
+            try: values = [float(word) for word in words[3:]]
+            except ValueError:
+                inFile.close()
+                raise ValueError("Non-numeric cluster parameter at line "+\
+                                     str(lineNum)+" of "+inPath)
+            names.append(words[0])
+            alleleA.append(words[1])
+            alleleB.append(words[2])
+            params.extend(values)
+        inFile.close()
+        if probes != None and len(names) != probes:
+            raise ValueError("Expected "+str(probes)+" probes, found "+\
+                                 str(len(names))+" in "+inPath)
+        probes = len(names)
+        params = numpy.frombuffer(params, numpy.float32).reshape(probes, 3, 3)
+        self.allocate(probes)
+        self.alleleA = alleleA
+        self.alleleB = alleleB
+        self.names = names
+        self.meanX[:,1:] = params[:,:,0]
+        self.meanY[:,1:] = params[:,:,1]
+        self.sd[:,1:] = params[:,:,2]
+
+    def writeTable(self, outPath, digits=6):
+        out = open(outPath, 'w')
+        out.write("\t".join(self.HEADER)+"\n")
+        template = "\t".join(["%."+str(digits)+"f"]*9)
+        for i in range(len(self)):
+            values = []
+            for j in range(1, self.GENOTYPES):
+                values.extend([self.meanX[i,j], self.meanY[i,j], self.sd[i,j]])
+            fields = [self.getName(i), self.alleleA[i], self.alleleB[i]]
+            out.write("\t".join(fields)+"\t"+(template % tuple(values))+"\n")
+        out.close()
@@ -0,0 +1,210 @@
+#! /software/bin/python
+
+#
+# Copyright (c) 2026 Genome Research Ltd. All rights reserved.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+# compute per-sample genotype QC metrics for all samples in a PLINK binary
+# dataset, as expected values for the genotyping QC pipeline
+
+# input: PLINK .bed/.bim/.fam, with SNP-major .bed, eg. from plinkGenerator.py
+
+# metrics are found on SNPs with call rate >= minimum (default 95%):
+# * call rate
+# * autosomal heterozygosity, on chromosomes 1-22
+# * X heterozygosity, on chromosome 23 (X), including PAR
+# * xhet for gender check, on chromosome 23 excluding PAR
+# het rate is het calls / successful calls, as in WTSI::NPG::Genotyping::QC::PlinkIO
+
+# outputs, in the given directory:
+# * sample_cr_het.txt, as read by WTSI::NPG::Genotyping::QC::Collator
+# * sample_xhet_gender.txt, as written by check_xhet_gender.pl and read by
+#   create_test_database.pl; inferred gender uses the default thresholds of
+#   check_xhet_gender.R, not the mixture model
+
+# the .bed file is memory-mapped and read in blocks of SNPs, within runs of
+# consecutive SNPs of the same chromosome type in the .bim file; each .bed
+# byte is expanded by lookup table into call and het flags for its 4 samples
+
+import array, getopt, os, sys, time
+import numpy
+from manifestIndex import manifestIndex
+
+class genotypeMetrics:
+
+    BED_MAGIC = '\x6c\x1b\x01' # SNP-major .bed
+    NO_CALL = 1 # .bed genotype codes: 0 = hom A1, 1 = no call, 2 = het, 3 = hom A2
+    HET = 2
+    # SNP types
+    AUTOSOME = 0
+    X_CHROM = 1 # X chromosome, outside PAR
+    X_PAR = 2
+    OTHER = 3 # Y, XY, MT, unplaced
+    TYPES = 4
+    BLOCK_CALLS = 2**24 # maximum SNPs*samples in a block
+    # default gender thresholds, as in WTSI::NPG::Genotyping::QC::GenderCheck
+    M_MAX_DEFAULT = 0.02
+    BOUNDARY_SD = 3
+    MIN_TRAINING = 100
+
+    def __init__(self, plinkPrefix, minCR=0.95, parPath=None):
+        self.plinkPrefix = plinkPrefix
+        self.minCR = minCR
+        index = manifestIndex()
+        if parPath != None: index.readParRanges(parPath)
+        self.index = index
+        (self.callTable, self.hetTable) = self.getLookupTables()
+
+    def countCallsHets(self):
+        # find call and het totals by sample, for each SNP type
+        # return (calls, hets) arrays of shape (TYPES, samples),
+        # and totals of SNPs passing call rate filter for each type
+        types = self.readBim(self.plinkPrefix+'.bim')
+        samples = len(self.names)
+        rowBytes = (samples+3)/4
+        bedPath = self.plinkPrefix+'.bed'
+        inFile = open(bedPath, 'rb')
+        magic = inFile.read(3)
+        inFile.close()
+        if magic != self.BED_MAGIC:
+            raise ValueError("Not a SNP-major .bed file: "+bedPath)
+        bed = numpy.memmap(bedPath, numpy.uint8, 'r', 3, (len(types), rowBytes))
+        calls = numpy.zeros((self.TYPES, samples), numpy.int64)
+        hets = numpy.zeros((self.TYPES, samples), numpy.int64)
+        passed = numpy.zeros(self.TYPES, numpy.int64)
+        blockSnps = max(1, self.BLOCK_CALLS/max(samples, 1))
+        for (snpType, start, end) in self.getRuns(types):
+            for i in range(start, end, blockSnps):
+                rows = bed[i:min(i+blockSnps, end)]
+                blockCalls = self.callTable[rows].reshape(len(rows), -1)[:,0:samples]
+                blockHets = self.hetTable[rows].reshape(len(rows), -1)[:,0:samples]
+                ok = blockCalls.sum(axis=1, dtype=numpy.int64) >= self.minCR*samples
+                calls[snpType] += blockCalls[ok].sum(axis=0, dtype=numpy.int64)
+                hets[snpType] += blockHets[ok].sum(axis=0, dtype=numpy.int64)
+                passed[snpType] += numpy.count_nonzero(ok)
+        del bed
+        self.snpTotal = len(types)
+        return (calls, hets, passed)
+
+    def getHetRates(self, calls, hets):
+        # het rate for each sample, zero if no calls
+        return numpy.where(calls > 0, hets/numpy.maximum(calls, 1).astype(float), 0)
+
+    def getInferredGenders(self, xhet):
+        # apply default thresholds of check_xhet_gender.R
+        # 1 = male, 2 = female, 0 = ambiguous
+        mMax = self.M_MAX_DEFAULT
+        nonMale = xhet[xhet >= mMax]
+        fMin = mMax
+        if len(nonMale) > self.MIN_TRAINING:
+            fMin = max(mMax, nonMale.mean() - self.BOUNDARY_SD*nonMale.std(ddof=1))
+        inferred = numpy.zeros(len(xhet), numpy.int8)
+        inferred[xhet <= mMax] = 1
+        inferred[xhet >= fMin] = 2
+        return inferred
+
+    def getLookupTables(self):
+        # call and het flags for each of 4 samples in every possible .bed byte
+        byte = numpy.arange(256, dtype=numpy.uint8)
+        codes = numpy.column_stack([(byte >> 2*k) & 3 for k in range(4)])
+        return ((codes != self.NO_CALL).astype(numpy.uint8),
+                (codes == self.HET).astype(numpy.uint8))
+
+    def getRuns(self, types):
+        # find (type, start, end) for runs of consecutive SNPs of the same type
+        runs = []
+        if len(types) == 0: return runs
+        changes = numpy.flatnonzero(numpy.diff(types)) + 1
+        starts = [0] + list(changes)
+        ends = list(changes) + [len(types)]
+        for (start, end) in zip(starts, ends):
+            runs.append((int(types[start]), int(start), int(end)))
+        return runs
+
+    def readBim(self, bimPath):
+        # stream .bim and find type of each SNP, stored as a compact array
+        types = array.array('b')
+        inFile = open(bimPath, 'r')
+        for line in inFile:
+            words = line.split()
+            if len(words) == 0: continue
+            chrom = self.index.getPlinkChrom(words[0])
+            if chrom >= 1 and chrom <= 22: types.append(self.AUTOSOME)
+            elif chrom != 23: types.append(self.OTHER)
+            elif self.index.isPar(chrom, int(words[3])): types.append(self.X_PAR)
+            else: types.append(self.X_CHROM)
+        inFile.close()
+        self.readFam(self.plinkPrefix+'.fam')
+        return numpy.frombuffer(types, numpy.int8)
+
+    def readFam(self, famPath):
+        names = []
+        sexes = []
+        inFile = open(famPath, 'r')
+        for line in inFile:
+            words = line.split()
+            if len(words) == 0: continue
+            names.append(words[1])
+            sexes.append(words[4])
+        inFile.close()
+        self.names = names
+        self.sexes = sexes
+
+    def writeMetrics(self, outDir):
+        if not os.path.exists(outDir): os.makedirs(outDir)
+        (calls, hets, passed) = self.countCallsHets()
+        total = passed.sum()
+        if total == 0: raise ValueError("No SNPs pass call rate filter")
+        cr = calls.sum(axis=0)/float(total)
+        autoHet = self.getHetRates(calls[self.AUTOSOME], hets[self.AUTOSOME])
+        xCalls = calls[self.X_CHROM] + calls[self.X_PAR]
+        xHet = self.getHetRates(xCalls, hets[self.X_CHROM] + hets[self.X_PAR])
+        out = open(os.path.join(outDir, 'sample_cr_het.txt'), 'w')
+        out.write("#Sample\tCR\tautosomal_het\tx_het\n")
+        out.write("#stats from %d/%d SNPs with CR >= %d%%\n" % \
+                      (total, self.snpTotal, round(self.minCR*100)))
+        for i in range(len(self.names)):
+            out.write("%s\t%.6f\t%.4f\t%.4f\n" % \
+                          (self.names[i], cr[i], autoHet[i], xHet[i]))
+        out.close()
+        xhet = self.getHetRates(calls[self.X_CHROM], hets[self.X_CHROM])
+        inferred = self.getInferredGenders(xhet)
+        out = open(os.path.join(outDir, 'sample_xhet_gender.txt'), 'w')
+        out.write("\t".join(['sample', 'xhet', 'inferred', 'supplied'])+"\n")
+        for i in range(len(self.names)):
+            out.write("%s\t%6f\t%d\t%s\n" % \
+                          (self.names[i], xhet[i], inferred[i], self.sexes[i]))
+        out.close()
+        return (total, passed[self.X_CHROM])
+
+def main():
+    (opts, args) = getopt.gnu_getopt(sys.argv[1:], '', ['min_cr=', 'par='])
+    opts = dict(opts)
+    plinkPrefix = args[0]
+    outDir = args[1]
+    minCR = float(opts.get('--min_cr', 0.95))
+    start = time.time()
+    metrics = genotypeMetrics(plinkPrefix, minCR, opts.get('--par'))
+    (total, xTotal) = metrics.writeMetrics(outDir)
+    print "Found metrics for "+str(len(metrics.names))+" samples, from "+\
+        str(total)+" SNPs passing call rate filter, "+str(xTotal)+\
+        " X chromosome SNPs outside PAR."
+    duration = time.time() - start
+    print "Finished.  Duration: "+str(duration)+" s"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#! /software/bin/python
+
+#
+# Copyright (c) 2026 Genome Research Ltd. All rights reserved.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+# compute per-sample intensity QC metrics from a .sim file, as an independent
+# check on the metrics found by 'simtools qc' in the genotyping pipeline
+
+# metrics, as computed by simtools:
+# * magnitude: mean over probes of normalised magnitude sqrt(x^2+y^2), where
+#   magnitude for each probe is normalised by its mean over all samples
+# * xydiff: mean over probes of (y - x)
+# * total NaN and total +/- infinity values (not computed by simtools)
+# each NaN or infinite x or y value is replaced by zero; no probes are omitted,
+# so means are over all probes and all samples
+# as in simtools, arithmetic is in 32-bit floats, and sums are accumulated in
+# order (probes for each sample, samples for each probe); this is needed for
+# outputs to agree with simtools to the last digit
+
+# regression check: on src/perl/t/qc_test_data/small_test.sim, outputs are
+# identical to output_examples/magnitude.txt and xydiff.txt; use the
+# --expected_magnitude and --expected_xydiff options to compare outputs
+
+# the .sim file is read in blocks of samples, so memory use does not depend on
+# the number of samples; blocks are processed by a pool of worker processes
+# magnitude normalisation needs probe means over all samples, so there are
+# two passes: the first finds xydiff, NaN/inf counts and magnitude totals for
+# each probe, the second finds normalised magnitude
+
+# outputs are tab-delimited, sample name and metric value on each line, in the
+# format of magnitude.txt and xydiff.txt read by WTSI::NPG::Genotyping::QC::Collator
+
+import getopt, multiprocessing, struct, sys, time
+import numpy
+
+class intensityMetrics:
+
+    HEADER_SIZE = 16
+    BLOCK_VALUES = 2**23 # default total intensity values per block of samples
+    NUMBER_FORMATS = {0:('<f4', 1.0), # IEEE 754 32-bit float
+                      1:('<u2', 1000.0)} # 16-bit unsigned scaled integer
+
+    def __init__(self, simPath, blockSize=None):
+        # by default, block size is chosen to limit memory use for large chips
+        self.simPath = simPath
+        self.readHeader()
+        if blockSize == None:
+            blockSize = max(1, self.BLOCK_VALUES/(self.probes*2))
+        self.blockSize = blockSize
+
+    def compareMetrics(self, outPath, expectedPath, digits=6):
+        # compare metric output with expected output, eg. from simtools
+        # return number of samples which are missing or differ, and max difference
+        expected = {}
+        inFile = open(expectedPath, 'r')
+        for line in inFile:
+            if line.startswith('#'): continue
+            words = line.split()
+            if len(words) >= 2: expected[words[0]] = float(words[1])
+        inFile.close()
+        mismatches = 0
+        maxDiff = 0.0
+        tolerance = 10**(-digits)
+        found = set()
+        inFile = open(outPath, 'r')
+        for line in inFile:
+            [name, value] = line.split()[0:2]
+            found.add(name)
+            if not expected.has_key(name):
+                mismatches += 1
+                continue
+            diff = abs(float(value) - expected[name])
+            maxDiff = max(maxDiff, diff)
+            if diff > tolerance: mismatches += 1
+        inFile.close()
+        mismatches += len(set(expected.keys()) - found)
+        return (mismatches, maxDiff)
+
+    def getBlockStarts(self):
+        return range(0, self.samples, self.blockSize)
+
+    def magnitudeBlock(self, start, probeMeans):
+        # normalised magnitude for each sample in the block starting at start
+        (names, x, y) = self.readFiniteBlock(start)
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            normalised = self.getMagnitude(x, y)/probeMeans
+        total = numpy.cumsum(normalised, axis=1, dtype=numpy.float32)[:,-1]
+        return (names, total/numpy.float32(self.probes))
+
+    def getMagnitude(self, x, y):
+        return numpy.sqrt(x*x + y*y)
+
+    def readBlock(self, start):
+        # read block of samples; return names, and x and y as float32 arrays
+        # NaN and infinite values are not replaced
+        total = min(self.blockSize, self.samples - start)
+        inFile = open(self.simPath, 'rb')
+        inFile.seek(self.HEADER_SIZE + start*self.recordType.itemsize)
+        records = numpy.fromfile(inFile, self.recordType, total)
+        inFile.close()
+        if len(records) != total:
+            raise ValueError("Unexpected end of .sim file: "+self.simPath)
+        names = [name.rstrip('\x00') for name in records['name']]
+        values = records['values'].astype(numpy.float32)/numpy.float32(self.scale)
+        return (names, values[:,:,0], values[:,:,1])
+
+    def readFiniteBlock(self, start):
+        # read block of samples, with NaN and infinite values replaced by zero
+        (names, x, y) = self.readBlock(start)
+        x[~numpy.isfinite(x)] = 0
+        y[~numpy.isfinite(y)] = 0
+        return (names, x, y)
+
+    def readHeader(self):
+        inFile = open(self.simPath, 'rb')
+        header = inFile.read(self.HEADER_SIZE)
+        inFile.close()
+        [magic, version, nameSize, samples, probes, channels, numberF] = \
+            struct.unpack('<3sBHIIBB', header)
+        if magic != 'sim':
+            raise ValueError("Not a .sim file: "+self.simPath)
+        if channels != 2:
+            raise ValueError("Expected 2 intensity channels, found "+\
+                                 str(channels))
+        try: (valueType, self.scale) = self.NUMBER_FORMATS[numberF]
+        except KeyError: raise ValueError("Incorrect .sim number format")
+        self.samples = samples
+        self.probes = probes
+        self.recordType = numpy.dtype([('name', 'S'+str(nameSize)),
+                                       ('values', valueType, (probes, channels))])
+
+    def statsBlock(self, start):
+        # first pass statistics for block of samples starting at start
+        # return names, xydiff, NaN and inf totals for each sample,
+        # and magnitude for each sample and probe
+        # magnitudes are returned unsummed, so that probe totals can be
+        # accumulated in sample order across blocks
+        (names, x, y) = self.readBlock(start)
+        nan = (numpy.isnan(x).sum(axis=1) + numpy.isnan(y).sum(axis=1))
+        inf = (numpy.isinf(x).sum(axis=1) + numpy.isinf(y).sum(axis=1))
+        x[~numpy.isfinite(x)] = 0
+        y[~numpy.isfinite(y)] = 0
+        total = numpy.cumsum(y - x, axis=1, dtype=numpy.float32)[:,-1]
+        xydiff = total/numpy.float32(self.probes)
+        return (names, xydiff, nan, inf, self.getMagnitude(x, y))
+
+    def writeMetrics(self, magPath, xydPath, nanInfPath=None, workers=1,
+                     digits=6):
+        # run both passes and write outputs; NaN/inf output is optional
+        if workers > 1: pool = multiprocessing.Pool(workers)
+        else: pool = None
+        starts = self.getBlockStarts()
+        template = "%s\t%."+str(digits)+"f\n"
+        xydOut = open(xydPath, 'w')
+        if nanInfPath != None:
+            nanInfOut = open(nanInfPath, 'w')
+            nanInfOut.write("#sample\tnan\tinf\n")
+        magTotals = numpy.zeros((1, self.probes), numpy.float32)
+        args = [(self.simPath, self.blockSize, start) for start in starts]
+        if pool: results = pool.imap(_statsBlock, args)
+        else: results = map(_statsBlock, args)
+        done = 0
+        for (names, xydiff, nan, inf, mag) in results:
+            for i in range(len(names)):
+                xydOut.write(template % (names[i], xydiff[i]))
+                if nanInfPath != None:
+                    nanInfOut.write("%s\t%d\t%d\n" % (names[i], nan[i], inf[i]))
+            magTotals = numpy.cumsum(numpy.vstack((magTotals, mag)), axis=0,
+                                     dtype=numpy.float32)[-1:]
+            done += len(names)
+            print "Pass 1: Read "+str(done)+" samples."; sys.stdout.flush()
+        xydOut.close()
+        if nanInfPath != None: nanInfOut.close()
+        probeMeans = magTotals[0]/numpy.float32(self.samples)
+        magOut = open(magPath, 'w')
+        args = [(self.simPath, self.blockSize, start, probeMeans)
+                for start in starts]
+        if pool: results = pool.imap(_magnitudeBlock, args)
+        else: results = map(_magnitudeBlock, args)
+        done = 0
+        for (names, magnitude) in results:
+            for i in range(len(names)):
+                magOut.write(template % (names[i], magnitude[i]))
+            done += len(names)
+            print "Pass 2: Read "+str(done)+" samples."; sys.stdout.flush()
+        magOut.close()
+        if pool:
+            pool.close()
+            pool.join()
+
+# module-level functions for worker processes (bound methods cannot be pickled)
+
+def _magnitudeBlock(args):
+    (simPath, blockSize, start, probeMeans) = args
+    return intensityMetrics(simPath, blockSize).magnitudeBlock(start, probeMeans)
+
+def _statsBlock(args):
+    (simPath, blockSize, start) = args
+    return intensityMetrics(simPath, blockSize).statsBlock(start)
+
+def main():
+    # options are named as for 'simtools qc'
+    (opts, args) = getopt.gnu_getopt(sys.argv[1:], '',
+                                     ['infile=', 'magnitude=', 'xydiff=',
+                                      'nan_inf=', 'block=', 'workers=',
+                                      'expected_magnitude=', 'expected_xydiff='])
+    opts = dict(opts)
+    if opts.has_key('--block'): blockSize = int(opts['--block'])
+    else: blockSize = None
+    workers = int(opts.get('--workers', 1))
+    start = time.time()
+    metrics = intensityMetrics(opts['--infile'], blockSize)
+    metrics.writeMetrics(opts['--magnitude'], opts['--xydiff'],
+                         opts.get('--nan_inf'), workers)
+    failed = False
+    for (outKey, expectedKey) in (('--magnitude', '--expected_magnitude'),
+                                  ('--xydiff', '--expected_xydiff')):
+        if not opts.has_key(expectedKey): continue
+        (mismatches, maxDiff) = metrics.compareMetrics(opts[outKey],
+                                                       opts[expectedKey])
+        print "Compared "+opts[outKey]+" with "+opts[expectedKey]+": "+\
+            str(mismatches)+" samples differ, max difference "+str(maxDiff)
+        if mismatches > 0: failed = True
+    duration = time.time() - start
+    print "Finished.  Duration: "+str(duration)+" s"
+    if failed: sys.exit(1)
+
+if __name__ == "__main__":
+    main()
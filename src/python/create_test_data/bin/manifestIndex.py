@@ -0,0 +1,123 @@
+#! /software/bin/python
+
+#
+# Copyright (c) 2026 Genome Research Ltd. All rights reserved.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+# stream an Illumina chip manifest in .bpm.csv format, and build a compact
+# per-SNP index for use by the fake data generators
+
+# input: manifest CSV with (at least) Name, Chromosome, Position, SNP columns
+# eg. src/ruby/genotyping-workflows/data/example_manifest.bpm.csv
+
+# the manifest is read one row at a time and never held in memory
+# the index stores one chromosome class and one pair of alleles per SNP,
+# in manifest order, as contiguous arrays; so class and alleles for SNP i
+# are found by array lookup, ~3 bytes per SNP for a multi-million SNP chip
+
+import array, csv
+
+class manifestIndex:
+
+    AUTOSOME = 0
+    X_CHROM = 1 # X chromosome, outside PAR
+    X_PAR = 2 # X chromosome inside PAR, or Illumina 'XY' chromosome
+    # Illumina chromosome names -> Plink chromosome codes
+    PLINK_CHROMS = {'X':23, 'Y':24, 'XY':25, 'MT':26}
+    # correct for GRCh37, see src/perl/etc/x_pseudoautosomal.txt
+    PAR_RANGES = [(60001, 2699520), (154931044, 155260560)]
+    NAME_KEY = 'Name'
+    CHROM_KEY = 'Chromosome'
+    POS_KEY = 'Position'
+    SNP_KEY = 'SNP'
+
+    def __init__(self, parRanges=None):
+        if parRanges == None: parRanges = self.PAR_RANGES
+        self.parRanges = parRanges
+        self.classes = array.array('B')
+        self.alleleA = array.array('c')
+        self.alleleB = array.array('c')
+
+    def __len__(self):
+        return len(self.classes)
+
+    def getAlleles(self, i):
+        return (self.alleleA[i], self.alleleB[i])
+
+    def getClass(self, i):
+        return self.classes[i]
+
+    def getPlinkChrom(self, chrom):
+        # convert Illumina chromosome name to Plink integer code
+        try: return self.PLINK_CHROMS[chrom]
+        except KeyError: return int(chrom)
+
+    def isPar(self, chrom, pos):
+        # chrom is a Plink chromosome code
+        if chrom == 25: return True
+        elif chrom != 23: return False
+        for (start, end) in self.parRanges:
+            if pos >= start and pos <= end: return True
+        return False
+
+    def isX(self, i):
+        return self.classes[i] == self.X_CHROM
+
+    def readParRanges(self, inPath):
+        # read PAR ranges in x_pseudoautosomal.txt format
+        parRanges = []
+        inFile = open(inPath, 'r')
+        for line in inFile:
+            words = line.split()
+            if len(words) == 0 or words[0].startswith('#'): continue
+            parRanges.append((int(words[0]), int(words[1])))
+        inFile.close()
+        self.parRanges = parRanges
+
+    def readSnps(self, inPath):
+        # generator: stream manifest and yield one SNP at a time
+        # yields (name, plink chromosome, position, allele A, allele B)
+        # each SNP is appended to the index as it is read
+        inFile = open(inPath, 'rb')
+        reader = csv.reader(inFile)
+        header = reader.next()
+        try:
+            cols = [header.index(key) for key in
+                    (self.NAME_KEY, self.CHROM_KEY, self.POS_KEY, self.SNP_KEY)]
+        except ValueError:
+            inFile.close()
+            raise ValueError("Missing column in manifest header: "+inPath)
+        [nameCol, chromCol, posCol, snpCol] = cols
+        for row in reader:
+            if len(row) == 0: continue
+            name = row[nameCol]
+            chrom = self.getPlinkChrom(row[chromCol])
+            pos = int(row[posCol])
+            # SNP field is in format eg. [A/C]
+            (a, b) = row[snpCol].strip('[]').split('/')
+            if self.isPar(chrom, pos): self.classes.append(self.X_PAR)
+            elif chrom == 23: self.classes.append(self.X_CHROM)
+            else: self.classes.append(self.AUTOSOME)
+            self.alleleA.append(a)
+            self.alleleB.append(b)
+            yield (name, chrom, pos, a, b)
+        inFile.close()
+
+    def readManifest(self, inPath):
+        # build index without any other output
+        for snp in self.readSnps(inPath): pass
+        return len(self)
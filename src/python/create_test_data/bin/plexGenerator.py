@@ -0,0 +1,404 @@
+#! /software/bin/python
+
+#
+# Copyright (c) 2026 Genome Research Ltd. All rights reserved.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+# generate fake Sequenom/Fluidigm QC plex calls for a PLINK binary dataset,
+# for testing and load testing of the Bayesian identity check
+
+# input: PLINK .bed/.bim/.fam, eg. as generated by plinkGenerator.py
+
+# plex SNPs are chosen at random from autosomal SNPs in the .bim file, which is
+# streamed; genotypes are read from the SNP-major .bed for plex SNPs only
+# for Sequenom, SNPs with '-' in the name are not used, because the Sequenom
+# assay ID is [plex name]-[SNP name] and is split on '-'
+# a plex call is the PLINK call for the same sample and SNP, except:
+# * with probability errorRate, the call is replaced by another genotype
+# * with probability noCallRate, the plex does not make a call
+# * PLINK no calls are replaced by a genotype drawn from the SNP's call frequencies
+# * a fraction swapRate of samples are swapped in pairs, within each chunk
+
+# outputs, written in chunks of samples:
+# * plex_calls_NNNN.vcf, as read by check_identity_bayesian.pl
+# * Sequenom or Fluidigm results as read by vcf_from_plex.pl:
+#   plex_calls_NNNN/Snnnn.csv, one file per sample, because the Fluidigm
+#   and Sequenom result sets allow only one sample per file
+# also:
+# * plex_snpset.tsv, plex manifest in WTSI::NPG::Genotyping::SNPSet format
+# * chromosomes.json, chromosome lengths for the vcf_from_plex.pl --chromosomes
+#   option, required for input from the filesystem
+# * plex_inputs.txt, list of .csv paths, for the vcf_from_plex.pl --input option
+# * sample.json, for the check_identity_bayesian.pl --sample_json option
+# * plex_swaps.txt, names of swapped sample pairs (ground truth for the check)
+
+import json, os, random, sys, time
+
+class plexGenerator:
+
+    BED_MAGIC = '\x6c\x1b\x01' # SNP-major .bed
+    # .bed genotype codes
+    HOM_A1 = 0
+    NO_CALL = 1
+    HET = 2
+    HOM_A2 = 3
+    SEQUENOM = 'sequenom'
+    FLUIDIGM = 'fluidigm'
+    URI_PREFIX = 'urn:wtsi:'
+    AUTOSOMES = range(1, 23)
+    BASES = ('A', 'C', 'G', 'T')
+    GENDERS = {'1':('Male', 1), '2':('Female', 2)}
+    # GRCh37 autosome lengths, as in src/perl/t/vcf/chromosome_lengths_GRCh37.json
+    CHROMOSOME_LENGTHS = {'1':249250621, '2':243199373, '3':198022430,
+                          '4':191154276, '5':180915260, '6':171115067,
+                          '7':159138663, '8':146364022, '9':141213431,
+                          '10':135534747, '11':135006516, '12':133851895,
+                          '13':115169878, '14':107349540, '15':102531392,
+                          '16':90354753, '17':81195210, '18':78077248,
+                          '19':59128983, '20':63025520, '21':48129895,
+                          '22':51304566}
+
+    def __init__(self, plexType, plexSize, errorRate=0.01, swapRate=0.01,
+                 noCallRate=0.02, plexName='plex01'):
+        if plexType not in (self.SEQUENOM, self.FLUIDIGM):
+            raise ValueError("Plex type must be '"+self.SEQUENOM+"' or '"+\
+                                 self.FLUIDIGM+"'")
+        if plexType == self.SEQUENOM and '-' in plexName:
+            raise ValueError("Sequenom plex name may not contain '-': "+plexName)
+        self.plexType = plexType
+        self.plexSize = plexSize
+        self.plexName = plexName
+        self.errorRate = errorRate
+        self.swapRate = swapRate
+        self.noCallRate = noCallRate
+        self.snps = [] # (name, chromosome, position, ref, alt, .bim index)
+        self.rows = [] # packed .bed rows for plex SNPs
+        self.freqs = [] # cumulative (HOM_A1, HET) call frequencies for plex SNPs
+        self.swaps = 0
+
+    def chooseSnps(self, bimPath):
+        # stream .bim and choose plex SNPs from autosomes by reservoir sampling
+        chosen = []
+        inFile = open(bimPath, 'r')
+        total = 0
+        excluded = 0
+        i = 0
+        for line in inFile:
+            words = line.split()
+            if self.plexType == self.SEQUENOM and '-' in words[1]:
+                excluded += 1
+            elif int(words[0]) in self.AUTOSOMES:
+                snp = (words[1], words[0], int(words[3]), words[4], words[5], i)
+                if total < self.plexSize: chosen.append(snp)
+                else:
+                    j = random.randint(0, total)
+                    if j < self.plexSize: chosen[j] = snp
+                total += 1
+            i += 1
+        inFile.close()
+        if total < self.plexSize:
+            message = "Plex size "+str(self.plexSize)+\
+                " exceeds total autosomal SNPs "+str(total)
+            if excluded > 0:
+                message += "; "+str(excluded)+" SNPs with '-' in the name "+\
+                    "cannot be used in Sequenom assay IDs"
+            raise ValueError(message)
+        if excluded > 0:
+            print "Excluded "+str(excluded)+" SNPs with '-' in the name "+\
+                "from Sequenom plex."
+        chosen.sort(key=lambda snp: snp[5])
+        snps = []
+        for (name, chrom, pos, a1, a2, index) in chosen:
+            # monomorphic SNPs have A1 = '0' in .bim; choose another base
+            if a2 == '0': a2 = random.choice(self.BASES)
+            if a1 == '0':
+                a1 = random.choice([b for b in self.BASES if b != a2])
+            snps.append((name, chrom, pos, a2, a1, index))
+        self.snps = snps
+        return snps
+
+    def getCall(self, i, sample):
+        # find plex call for plex SNP i and sample index, or None for no call
+        # call is (allele, allele) with ref/alt as .bim A2/A1
+        (name, chrom, pos, ref, alt, index) = self.snps[i]
+        if random.random() < self.noCallRate: return None
+        byte = ord(self.rows[i][sample >> 2])
+        code = (byte >> 2*(sample & 3)) & 3
+        if code == self.NO_CALL:
+            x = random.random()
+            if x < self.freqs[i][0]: code = self.HOM_A1
+            elif x < self.freqs[i][1]: code = self.HET
+            else: code = self.HOM_A2
+        if random.random() < self.errorRate:
+            code = random.choice([c for c in (self.HOM_A1, self.HET, self.HOM_A2)
+                                  if c != code])
+        if code == self.HOM_A1: return (alt, alt)
+        elif code == self.HET: return (ref, alt)
+        else: return (ref, ref)
+
+    def getFrequencies(self, row, total):
+        # cumulative frequencies of (HOM_A1, HET) calls in a .bed row
+        counts = [0]*4
+        for sample in range(total):
+            counts[(ord(row[sample >> 2]) >> 2*(sample & 3)) & 3] += 1
+        calls = total - counts[self.NO_CALL]
+        if calls == 0: return (1/3.0, 2/3.0)
+        homA1 = counts[self.HOM_A1]/float(calls)
+        return (homA1, homA1 + counts[self.HET]/float(calls))
+
+    def getSwaps(self, total):
+        # choose disjoint pairs of sample positions to swap, within a chunk
+        pairs = int(round(total*self.swapRate/2))
+        chosen = random.sample(range(total), 2*pairs)
+        swaps = range(total)
+        for j in range(pairs):
+            (a, b) = chosen[2*j:2*j+2]
+            swaps[a] = b
+            swaps[b] = a
+        return swaps
+
+    def getSsid(self, name):
+        # Sanger sample ID from PLINK sample name in URI format
+        if name.startswith(self.URI_PREFIX): return name[len(self.URI_PREFIX):]
+        else: return name
+
+    def getVcfHeader(self, snpsetPath, ssids):
+        lines = ['##fileformat=VCFv4.2',
+                 '##fileDate='+time.strftime('%Y%m%d'),
+                 '##source=WTSI_NPG_genotyping_pipeline',
+                 '##reference=file://'+os.path.abspath(snpsetPath),
+                 '##callset_name='+self.plexType+'_'+self.plexName,
+                 '##plex_type='+self.plexType,
+                 '##plex_name='+self.plexName,
+                 '##INFO=<ID=ORIGINAL_STRAND,Number=1,Type=String,'+\
+                     'Description="Direction of strand in input file">',
+                 '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+                 '##FORMAT=<ID=GQ,Number=1,Type=Integer,'+\
+                     'Description="Genotype Quality">',
+                 '##FORMAT=<ID=DP,Number=1,Type=Integer,'+\
+                     'Description="Read Depth">',
+                 "\t".join(['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER',
+                            'INFO', 'FORMAT']+ssids),
+                 ]
+        return "\n".join(lines)+"\n"
+
+    def getVcfGenotype(self, call, ref):
+        if call == None: return './.:.:1'
+        codes = []
+        for allele in call:
+            if allele == ref: codes.append('0')
+            else: codes.append('1')
+        return '/'.join(codes)+':.:1'
+
+    def getFluidigmLines(self, ssid, calls, sampleAddress):
+        # Fluidigm assay results for one sample, tab-delimited
+        # assay, snp_assayed, x_allele, y_allele, sample_name, type, auto,
+        # confidence, final, converted_call, x_intensity, y_intensity
+        # assay field is [sample address]-[assay address], eg. S0001-A0001
+        lines = []
+        for i in range(len(self.snps)):
+            (name, chrom, pos, ref, alt, index) = self.snps[i]
+            assay = sampleAddress+'-A'+str(i+1).zfill(4)
+            call = calls[i]
+            if call == None: (final, converted) = ('No Call', 'No Call')
+            else:
+                if call[0] != call[1]: final = 'XY'
+                elif call[0] == ref: final = 'XX'
+                else: final = 'YY'
+                converted = call[0]+':'+call[1]
+            fields = [assay, name, ref, alt, ssid, 'Unknown', 'Unknown', '99.99',
+                      final, converted, '0.5', '0.5']
+            lines.append("\t".join(fields)+"\n")
+        return lines
+
+    def getSequenomLines(self, ssid, calls, chunk, position):
+        # Sequenom assay results for one sample, tab-delimited, one line per allele
+        lines = []
+        plate = 'plate'+str(chunk+1).zfill(4)
+        well = 'W'+str(position+1).zfill(6)
+        for i in range(len(self.snps)):
+            (name, chrom, pos, ref, alt, index) = self.snps[i]
+            assayId = self.plexName+'-'+name
+            call = calls[i]
+            if call == None: (alleles, genotype) = (('', ''), '')
+            elif call[0] == call[1]: (alleles, genotype) = (call, call[0])
+            else: (alleles, genotype) = (call, call[0]+call[1])
+            for allele in alleles:
+                fields = [allele, assayId, '1', 'customer1', 'experiment1',
+                          genotype, '10', '1', plate, 'project1', ssid, '1', well]
+                lines.append("\t".join(fields)+"\n")
+        return lines
+
+    def getSampleAddress(self, position):
+        # sample address for sample position within a chunk, eg. S0001
+        return 'S'+str(position+1).zfill(4)
+
+    def getSequenomHeader(self):
+        fields = ['ALLELE', 'ASSAY_ID', 'CHIP', 'CUSTOMER', 'EXPERIMENT',
+                  'GENOTYPE_ID', 'HEIGHT', 'MASS', 'PLATE', 'PROJECT',
+                  'SAMPLE_ID', 'STATUS', 'WELL_POSITION']
+        return "\t".join(fields)+"\n"
+
+    def readBedRows(self, bedPath, total):
+        # read .bed rows for plex SNPs only, by seeking to each row
+        rowBytes = (total+3)/4
+        inFile = open(bedPath, 'rb')
+        if inFile.read(3) != self.BED_MAGIC:
+            inFile.close()
+            raise ValueError("Not a SNP-major .bed file: "+bedPath)
+        rows = []
+        freqs = []
+        for snp in self.snps:
+            inFile.seek(3 + snp[5]*rowBytes)
+            row = inFile.read(rowBytes)
+            rows.append(row)
+            freqs.append(self.getFrequencies(row, total))
+        inFile.close()
+        self.rows = rows
+        self.freqs = freqs
+
+    def readFam(self, famPath):
+        # read sample names and PLINK sex codes
+        inFile = open(famPath, 'r')
+        samples = []
+        for line in inFile:
+            words = line.split()
+            if len(words) == 0: continue
+            samples.append((words[1], words[4]))
+        inFile.close()
+        return samples
+
+    def writeChunk(self, outDir, chunk, samples, start, snpsetPath):
+        # write plex calls for samples in range [start, start+chunkSize)
+        # return paths to .csv outputs, and swapped pairs of sample names
+        total = len(samples)
+        swaps = self.getSwaps(total)
+        ssids = [self.getSsid(name) for (name, sex) in samples]
+        prefix = os.path.join(outDir, 'plex_calls_'+str(chunk+1).zfill(4))
+        allCalls = []
+        swapped = []
+        for j in range(total):
+            # plex calls for sample j are made from genotypes of sample swaps[j]
+            source = start + swaps[j]
+            calls = [self.getCall(i, source) for i in range(len(self.snps))]
+            allCalls.append(calls)
+            if swaps[j] > j: swapped.append((samples[j][0], samples[swaps[j]][0]))
+        out = open(prefix+'.vcf', 'w')
+        out.write(self.getVcfHeader(snpsetPath, ssids))
+        for i in range(len(self.snps)):
+            (name, chrom, pos, ref, alt, index) = self.snps[i]
+            fields = [chrom, str(pos), name, ref, alt, '.', '.', '.', 'GT:GQ:DP']
+            for calls in allCalls: fields.append(self.getVcfGenotype(calls[i], ref))
+            out.write("\t".join(fields)+"\n")
+        out.close()
+        # one file per sample, in a subdirectory for the chunk
+        csvPaths = []
+        if not os.path.exists(prefix): os.makedirs(prefix)
+        for j in range(total):
+            address = self.getSampleAddress(j)
+            csvPath = os.path.join(prefix, address+'.csv')
+            out = open(csvPath, 'w')
+            if self.plexType == self.SEQUENOM:
+                out.write(self.getSequenomHeader())
+                lines = self.getSequenomLines(ssids[j], allCalls[j], chunk, j)
+            else:
+                lines = self.getFluidigmLines(ssids[j], allCalls[j], address)
+            for line in lines: out.write(line)
+            out.close()
+            csvPaths.append(csvPath)
+        return (csvPaths, swapped)
+
+    def writePlex(self, plinkPrefix, outDir, chunkSize=1000):
+        # write all plex outputs for the given PLINK binary dataset
+        if not os.path.exists(outDir): os.makedirs(outDir)
+        samples = self.readFam(plinkPrefix+'.fam')
+        self.chooseSnps(plinkPrefix+'.bim')
+        self.readBedRows(plinkPrefix+'.bed', len(samples))
+        snpsetPath = os.path.join(outDir, 'plex_snpset.tsv')
+        self.writeSnpset(snpsetPath)
+        self.writeChromosomes(os.path.join(outDir, 'chromosomes.json'))
+        inputs = open(os.path.join(outDir, 'plex_inputs.txt'), 'w')
+        swapsOut = open(os.path.join(outDir, 'plex_swaps.txt'), 'w')
+        sampleOut = open(os.path.join(outDir, 'sample.json'), 'w')
+        sampleOut.write('[')
+        separator = ''
+        chunk = 0
+        for start in range(0, len(samples), chunkSize):
+            chunkSamples = samples[start:start+chunkSize]
+            (csvPaths, swapped) = self.writeChunk(outDir, chunk, chunkSamples,
+                                                  start, snpsetPath)
+            for csvPath in csvPaths: inputs.write(os.path.abspath(csvPath)+"\n")
+            for pair in swapped: swapsOut.write("\t".join(pair)+"\n")
+            self.swaps += len(swapped)
+            for (name, sex) in chunkSamples:
+                record = self.getSampleRecord(name, sex)
+                sampleOut.write(separator+"\n    "+json.dumps(record))
+                separator = ','
+            chunk += 1
+            print "Wrote "+str(start+len(chunkSamples))+" samples."; sys.stdout.flush()
+        sampleOut.write("\n]\n")
+        for out in (inputs, swapsOut, sampleOut): out.close()
+        return chunk
+
+    def getSampleRecord(self, name, sex):
+        # sample data in format read by check_identity_bayesian.pl --sample_json
+        (gender, code) = self.GENDERS.get(sex, ('Unknown', 0))
+        return {'gender':gender,
+                'gender_code':code,
+                'gender_method':'Supplied',
+                'sanger_sample_id':self.getSsid(name),
+                'uri':name}
+
+    def writeChromosomes(self, outPath):
+        # write lengths of plex SNP chromosomes, in the format read by
+        # vcf_from_plex.pl; length is increased if needed to cover all positions
+        lengths = {}
+        for (name, chrom, pos, ref, alt, index) in self.snps:
+            length = self.CHROMOSOME_LENGTHS.get(chrom, 0)
+            lengths[chrom] = max(lengths.get(chrom, length), pos)
+        out = open(outPath, 'w')
+        out.write(json.dumps(lengths, sort_keys=True)+"\n")
+        out.close()
+
+    def writeSnpset(self, outPath):
+        # write plex manifest in WTSI::NPG::Genotyping::SNPSet format
+        out = open(outPath, 'w')
+        out.write("\t".join(['#SNP_NAME', 'REF_ALLELE', 'ALT_ALLELE', 'CHR',
+                             'POS', 'STRAND'])+"\n")
+        for (name, chrom, pos, ref, alt, index) in self.snps:
+            out.write("\t".join([name, ref, alt, chrom, str(pos), '+'])+"\n")
+        out.close()
+
+def main():
+    plinkPrefix = sys.argv[1] # PLINK binary dataset
+    outDir = sys.argv[2]
+    plexType = sys.argv[3] # sequenom or fluidigm
+    plexSize = int(sys.argv[4])
+    errorRate = float(sys.argv[5])
+    swapRate = float(sys.argv[6])
+    if len(sys.argv) > 7: chunkSize = int(sys.argv[7])
+    else: chunkSize = 1000
+    if len(sys.argv) > 8: random.seed(int(sys.argv[8]))
+    start = time.time()
+    gen = plexGenerator(plexType, plexSize, errorRate, swapRate)
+    chunks = gen.writePlex(plinkPrefix, outDir, chunkSize)
+    print "Wrote "+str(chunks)+" chunks, "+str(gen.swaps)+" swapped pairs."
+    duration = time.time() - start
+    print "Finished.  Duration: "+str(duration)+" s"
+
+if __name__ == "__main__":
+    main()
@@ -46,10 +46,23 @@
 
 # all chromosome annotation contained in .map file (including X/not-X and PAR status)
 
+# optionally, SNP names, positions and alleles are read from an Illumina manifest
+# in .bpm.csv format; the manifest is streamed, and a compact index of X/PAR status
+# and alleles by SNP is kept for genotype generation (see manifestIndex.py)
+
 # also want to generate fake .sim files to accompany PLINK data...
 
+# append mode: add new samples to an existing binary dataset
+# new samples are generated in .ped format and converted to binary as usual, with
+# sample numbering continuing from the last sample in the existing .fam
+# .fam is appended in place; SNP-major .bed rows must grow, so .bed and .bim are
+# rewritten in a single streamed pass, in blocks of SNPs, without regenerating
+# existing calls: existing .bed bytes are copied unchanged, and new rows are
+# bit-shifted into the last partial byte of existing rows (requires NumPy)
+
 import math, os, random, re, sys, time
 from xml.dom import minidom
+from manifestIndex import manifestIndex
 
 class plinkGenerator:
 
@@ -64,6 +77,10 @@ class plinkGenerator:
     MALE_KEY = 'MALE'
     NAME_PLATE = 0
     NAME_NOPLATE = 1
+    APPEND = 'append'
+    APPEND_SUFFIX = '_append'
+    BED_MAGIC = '\x6c\x1b\x01' # SNP-major .bed
+    BLOCK_BYTES = 2**24 # maximum .bed bytes per block of SNPs in append mode
 
     def __init__(self, family='family_name', nameType=0, plateRows=12, plateCols=8):
         self.plateRows = plateRows
@@ -74,10 +91,13 @@ class plinkGenerator:
         self.chroms = range(1, 27)
         self.chroms.append(self.HIDDEN_PAR)
         self.family = family
+        self.index = None
+        self.bedSwap = self.getBedSwapTable()
 
-    def getAlleles(self, gender, isX, probs):
+    def getAlleles(self, gender, isX, probs, bases=('A', 'C')):
         # generate a random pair of allele values for given params
-        # assume all calls are A or C (0 for no calls)
+        # by default, assume all calls are A or C (0 for no calls)
+        # bases = (major, minor) alleles
         call = True
         het = True
         if random.random() <= probs[self.NO_CALL_KEY]:
@@ -89,21 +109,33 @@ class plinkGenerator:
             if random.random() <= probs[self.AUTO_HET_KEY]: het = True
             else: het = False
         if call:
-            if het: alleles = ('A', 'C') 
-            elif random.random() < self.MAF_HOM: alleles = ('C', 'C')
-            else: alleles = ('A', 'A')
+            if het: alleles = bases
+            elif random.random() < self.MAF_HOM: alleles = (bases[1], bases[1])
+            else: alleles = (bases[0], bases[0])
         else:
             alleles = (0,0)
         return alleles
 
-    def getAlleleString(self, gender, isX, probs):
-        alleles = self.getAlleles(gender, isX, probs)
+    def getAlleleString(self, gender, isX, probs, bases=('A', 'C')):
+        alleles = self.getAlleles(gender, isX, probs, bases)
         return str(alleles[0])+" "+str(alleles[1])
 
+    def getBedSwapTable(self):
+        # translation table to swap homozygous codes 00 and 11 in each byte of a .bed row
+        # (codes 01 = no call, 10 = het are unchanged)
+        table = []
+        for byte in range(256):
+            codes = self.unpackBedRow(chr(byte), 4)
+            for i in range(4):
+                if codes[i] == 0: codes[i] = 3
+                elif codes[i] == 3: codes[i] = 0
+            table.append(self.packBedRow(codes))
+        return ''.join(table)
+
     def getPedLines(self, sample, snps, probs, makeDuplicate=False, appendNewLine=True):
         # generate line of .ped format input; contains information on SNPs for a single sample
         # optionally, generate a duplicate line (distinct sample name, otherwise identical) for QC test
-        # snps = dictionary of SNP counts by chromosome
+        # snps = dictionary of SNP counts by chromosome; ignored if manifest index is present
         # initial .ped fields:
         # [Family ID, Individual ID, Paternal ID, Maternal ID, Sex (1=male; 2=female; other=unknown), Phenotype]
         [paternal, maternal] = [0]*2
@@ -112,14 +144,21 @@ class plinkGenerator:
         if random.random() <= probs[self.MALE_KEY]: gender = self.MALE_GENDER
         else: gender = self.FEMALE_GENDER
         phenotype = 0
-        fields = [family, None, paternal, maternal, gender, phenotype] # None is placeholder for sample name(s)
+        fields = [self.family, None, paternal, maternal, gender, phenotype] # None is placeholder for sample name(s)
         # generate snp calls (or uncalls) and append to fields
-        for chrom in self.chroms:
-            if not snps.has_key(chrom): continue
-            for i in range(snps[chrom]):
-                if chrom == 23 or chrom == self.HIDDEN_PAR: isX = True
-                else: isX = False
-                fields.append(self.getAlleleString(gender, isX, probs))
+        if self.index != None:
+            # PAR SNPs from manifest are called as for autosomes
+            for i in xrange(len(self.index)):
+                isX = self.index.isX(i)
+                bases = self.index.getAlleles(i)
+                fields.append(self.getAlleleString(gender, isX, probs, bases))
+        else:
+            for chrom in self.chroms:
+                if not snps.has_key(chrom): continue
+                for i in range(snps[chrom]):
+                    if chrom == 23 or chrom == self.HIDDEN_PAR: isX = True
+                    else: isX = False
+                    fields.append(self.getAlleleString(gender, isX, probs))
         # convert output to string(s)
         lines = []
         for name in names:
@@ -155,11 +194,138 @@ class plinkGenerator:
             sampleName = "urn:wtsi:"+sampleName
         return sampleName
 
+    def appendBedBlock(self, oldRows, newRows, oldTotal, newTotal):
+        # merge blocks of .bed rows, as (SNPs, bytes) arrays of uint8
+        # bytes of existing rows are copied unchanged; new rows are shifted
+        # left by the number of bits used in the last byte of existing rows
+        import numpy
+        shift = 2*(oldTotal % 4)
+        if shift == 0:
+            merged = numpy.hstack((oldRows, newRows))
+        else:
+            (snps, oldBytes) = oldRows.shape
+            mergedBytes = (oldTotal+newTotal+3)/4
+            merged = numpy.zeros((snps, mergedBytes), numpy.uint8)
+            merged[:,0:oldBytes] = oldRows
+            # clear any padding bits in the last byte of existing rows
+            merged[:,oldBytes-1] &= (1 << shift) - 1
+            shifted = newRows.astype(numpy.uint16) << shift
+            width = min(newRows.shape[1], mergedBytes-oldBytes+1)
+            merged[:,oldBytes-1:oldBytes-1+width] |= \
+                (shifted[:,0:width] & 0xFF).astype(numpy.uint8)
+            carry = mergedBytes - oldBytes
+            merged[:,oldBytes:] |= (shifted[:,0:carry] >> 8).astype(numpy.uint8)
+        # clear padding bits after the last new sample
+        used = 2*((oldTotal+newTotal) % 4)
+        if used > 0: merged[:,-1] &= (1 << used) - 1
+        return merged
+
+    def appendPlinkBinary(self, prefix, newPrefix):
+        # append samples in newPrefix .bed/.bim/.fam to existing dataset in prefix
+        # SNPs must be identical; allele codes of new samples are matched to existing .bim
+        # .bed and .bim are written to temporary files, and renamed only when
+        # both are complete; .fam is appended last
+        import itertools, numpy
+        oldTotal = len(self.readFam(prefix+'.fam'))
+        newTotal = len(self.readFam(newPrefix+'.fam'))
+        oldBytes = (oldTotal+3)/4
+        newBytes = (newTotal+3)/4
+        blockSnps = max(1, self.BLOCK_BYTES/(oldBytes+newBytes))
+        swapTable = numpy.frombuffer(self.bedSwap, numpy.uint8)
+        oldBed = open(prefix+'.bed', 'rb')
+        newBed = open(newPrefix+'.bed', 'rb')
+        for bed in (oldBed, newBed):
+            if bed.read(3) != self.BED_MAGIC:
+                raise ValueError("Not a SNP-major .bed file: "+bed.name)
+        oldBim = open(prefix+'.bim', 'r')
+        newBim = open(newPrefix+'.bim', 'r')
+        bedTmp = prefix+'.bed.tmp'
+        bimTmp = prefix+'.bim.tmp'
+        bedOut = open(bedTmp, 'wb')
+        bedOut.write(self.BED_MAGIC)
+        bimOut = open(bimTmp, 'w')
+        while True:
+            oldSnps = [line.split() for line in itertools.islice(oldBim, blockSnps)]
+            newSnps = [line.split() for line in itertools.islice(newBim, blockSnps)]
+            if len(oldSnps) != len(newSnps):
+                raise ValueError("SNP totals differ: "+prefix+", "+newPrefix)
+            snps = len(oldSnps)
+            if snps == 0: break
+            swaps = []
+            for i in range(snps):
+                (alleles, swap) = self.mergeAlleles(oldSnps[i], newSnps[i])
+                bimOut.write("\t".join(oldSnps[i][0:4]+alleles)+"\n")
+                swaps.append(swap)
+            oldRows = numpy.fromfile(oldBed, numpy.uint8, snps*oldBytes)
+            newRows = numpy.fromfile(newBed, numpy.uint8, snps*newBytes)
+            if len(oldRows) != snps*oldBytes or len(newRows) != snps*newBytes:
+                raise ValueError("Unexpected end of .bed file: "+prefix+", "+\
+                                     newPrefix)
+            oldRows = oldRows.reshape(snps, oldBytes)
+            newRows = newRows.reshape(snps, newBytes)
+            swaps = numpy.array(swaps, bool)
+            newRows[swaps] = swapTable[newRows[swaps]]
+            merged = self.appendBedBlock(oldRows, newRows, oldTotal, newTotal)
+            bedOut.write(merged.tostring())
+        for inFile in (oldBed, newBed, oldBim, newBim): inFile.close()
+        bedOut.close()
+        bimOut.close()
+        os.rename(bedTmp, prefix+'.bed')
+        os.rename(bimTmp, prefix+'.bim')
+        out = open(prefix+'.fam', 'a')
+        inFile = open(newPrefix+'.fam', 'r')
+        for line in inFile: out.write(line)
+        inFile.close()
+        out.close()
+        return oldTotal+newTotal
+
+    def getAppendOffset(self, famPath):
+        # find number of first new sample, continuing from last sample in .fam
+        fam = self.readFam(famPath)
+        if len(fam) == 0: return 0
+        match = re.search('[0-9]+$', fam[-1][1])
+        if match: return int(match.group(0))+1
+        else: return len(fam)
+
     def makePlinkBinary(self, prefix):
         # convert text plink output to binary
         cmd = 'plink --file '+prefix+' --out '+prefix+' --make-bed'
         os.system(cmd)
 
+    def mergeAlleles(self, oldSnp, newSnp):
+        # find merged (A1, A2) alleles for a SNP in existing and new .bim
+        # existing allele codes are kept, apart from filling a missing A1 ('0')
+        # return alleles, and True if new homozygous codes must be swapped
+        if oldSnp[1] != newSnp[1]:
+            raise ValueError("SNP names differ: "+oldSnp[1]+", "+newSnp[1])
+        [a1, a2] = oldSnp[4:6]
+        [b1, b2] = newSnp[4:6]
+        if a2 == '0': [a1, a2] = [b1, b2] # no calls in existing samples
+        elif a1 == '0':
+            if b1 not in ('0', a2): a1 = b1
+            elif b2 != a2: a1 = b2
+        for b in (b1, b2):
+            if b not in ('0', a1, a2):
+                raise ValueError("Too many alleles for SNP "+oldSnp[1])
+        swap = (b2 != '0' and b2 == a1) or (b1 != '0' and b1 == a2)
+        return ([a1, a2], swap)
+
+    def packBedRow(self, codes):
+        # pack list of 2-bit genotype codes into .bed bytes, low-order bits first
+        chars = []
+        for i in range(0, len(codes), 4):
+            byte = 0
+            for j in range(len(codes[i:i+4])): byte |= codes[i+j] << 2*j
+            chars.append(chr(byte))
+        return ''.join(chars)
+
+    def readFam(self, famPath):
+        # read .fam as list of fields per sample
+        inFile = open(famPath, 'r')
+        samples = [line.split() for line in inFile if line.strip() != '']
+        inFile.close()
+        return samples
+
     def readConfig(self, configPath):
         # read snp totals by chromosome, and probabilities, from xml config path
         doc = minidom.parse(configPath)
@@ -180,13 +346,23 @@ class plinkGenerator:
             probs[ch.tagName] = prob
         return (snps, probs)
 
-    def writeMap(self, outPath, snps, gap=500000, namePrefix="fakeSNP"):
+    def writeMap(self, outPath, snps, gap=500000, namePrefix="fakeSNP", manifest=None):
         # generate fake SNP annotation and write in .map format
         # fields: chromosome, SNP ID, genetic distance, base-pair position
         # gap (between SNPs) should be of similar order to 10**6, to allow duplicate check
+        # if manifest path is given, use SNPs from manifest instead of snps/gap/namePrefix
         dist = 0
         out = open(outPath, 'w')
         count = 0
+        if manifest != None:
+            self.index = manifestIndex()
+            for (name, chrom, pos, a, b) in self.index.readSnps(manifest):
+                fields = [chrom, name, dist, pos]
+                words = []
+                for field in fields: words.append(str(field))
+                out.write("\t".join(words)+"\n")
+            out.close()
+            return
         for chrom in self.chroms:
             if not snps.has_key(chrom): continue
             for i in range(snps[chrom]):
@@ -221,6 +397,14 @@ class plinkGenerator:
             print "Wrote "+str(i)+" samples."; sys.stdout.flush()
         out.close()
 
+    def unpackBedRow(self, row, total):
+        # unpack .bed bytes into list of 2-bit genotype codes for total samples
+        codes = []
+        for char in row:
+            byte = ord(char)
+            codes.extend([byte & 3, (byte >> 2) & 3, (byte >> 4) & 3, byte >> 6])
+        return codes[0:total]
+
 """
 snps = {1:100,
         23:100,
@@ -237,9 +421,11 @@ config = sys.argv[1]
 gap = int(sys.argv[2])
 sampleTotal = int(sys.argv[3])
 duplicates = int(sys.argv[4])
-sampleOffset = int(sys.argv[5])
+sampleOffset = sys.argv[5] # integer, or 'append' to add to existing dataset
 prefix = sys.argv[6]
 nameType = int(sys.argv[7])
+if len(sys.argv) > 8: manifest = sys.argv[8]
+else: manifest = None
 terms = re.split('/', prefix)
 filePrefix = terms.pop()
 family = 'family_'+filePrefix
@@ -247,11 +433,20 @@ start = time.time()
 
 gen = plinkGenerator(family, nameType)
 (snps, probs) = gen.readConfig(config)
-mapPath = prefix+'.map'
-gen.writeMap(mapPath, snps, gap, namePrefix=prefix+'_fakeSNP')
+if sampleOffset == gen.APPEND:
+    outPrefix = prefix+gen.APPEND_SUFFIX
+    sampleOffset = gen.getAppendOffset(prefix+'.fam')
+else:
+    outPrefix = prefix
+    sampleOffset = int(sampleOffset)
+mapPath = outPrefix+'.map'
+gen.writeMap(mapPath, snps, gap, namePrefix=prefix+'_fakeSNP', manifest=manifest)
 print "Wrote .map file."
-pedPath = prefix+'.ped'
+pedPath = outPrefix+'.ped'
 gen.writePed(pedPath, sampleTotal, snps, probs, duplicates, sampleOffset)
-gen.makePlinkBinary(prefix)
+gen.makePlinkBinary(outPrefix)
+if outPrefix != prefix:
+    total = gen.appendPlinkBinary(prefix, outPrefix)
+    print "Appended samples to "+prefix+", new sample total: "+str(total)
 duration = time.time() - start
 print "Finished.  Duration: "+str(duration)+" s"
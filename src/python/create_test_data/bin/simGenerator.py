@@ -24,16 +24,27 @@
 
 # generate plausible fake .sim intensity data for given genotypes
 
-# input: PLINK .ped file
+# input: PLINK .ped file; optionally, Illumina manifest used to generate the .ped
+# (manifest allele A is the X intensity channel, allele B is Y)
 
 # generate intensities at random:
 # # major (signal) component based on genotype
 # # minor (noise) component
 
+# with --append, samples are appended to an existing .sim file; header sample
+# count is updated in place, and existing intensities are not rewritten
+
 # some 'no calls' are sampled from a completely uniform noise dsitribution
 # bears no relation to what a 'real' genotype caller might decide, but good enough for simple testing
 
-import math, random, re, struct, sys
+# optionally, use a per-probe cluster table (see clusterTable.py) instead of the same
+# signal/noise distributions for every probe; the table is generated from a random
+# seed (--seed) or read from file (--clusters), and may be written for reuse
+# (--write_clusters); allele strings for each probe are then taken from the table
+# the cluster table requires NumPy, which is imported only when a table is used
+
+import getopt, math, random, re, struct, sys
+from manifestIndex import manifestIndex
 
 class simGenerator:
 
@@ -41,6 +52,8 @@ class simGenerator:
     XX_CALL = 1
     XY_CALL = 2
     YY_CALL = 3
+    SAMPLE_COUNT_OFFSET = 6 # byte offset of sample count in .sim header
+    APPEND_FLAG = '--append'
 
     def __init__(self, signalMean=1, signalSD=0.25, noiseMean=0, noiseSD=0.1, 
                  nanRate=0.01, infRate=0.01, bases=['A','C']):
@@ -58,7 +71,24 @@ class simGenerator:
         self.noCallNoise = 0.2
         self.root2 = math.sqrt(2)
         self.nameSize = 40
-    
+        self.index = None
+        self.snpNames = None
+        self.table = None
+        self.numpy = None # imported by importNumpy, only if a cluster table is used
+
+    def appendSim(self, outPath, results, samples, probes):
+        # append samples to existing .sim file, and update sample count in header
+        out = open(outPath, 'r+b')
+        (oldSamples, oldProbes) = self.readSimHeader(out)
+        if oldProbes != probes:
+            out.close()
+            raise ValueError("Probe totals differ: "+str(oldProbes)+", "+str(probes))
+        out.seek(self.SAMPLE_COUNT_OFFSET)
+        out.write(struct.pack('I', oldSamples+len(samples)))
+        out.seek(0, 2)
+        self.writeSimRows(out, results, samples)
+        out.close()
+        return oldSamples+len(samples)
 
     def generateIntensity(self, genotype):
         # generate (x,y) intensities for given genotype, sampled from signal/noise distributions
@@ -88,6 +118,22 @@ class simGenerator:
             y = signal
         return (x,y)
 
+    def getSimArrayBlock(self, sample, nameSize, signals):
+        # convert sample name and numpy array of floats to binary .sim entries
+        # vectorized equivalent of getSimBlock, for .sim number format 0 only
+        numpy = self.numpy
+        signals = signals.astype('<f4')
+        total = len(signals)
+        nan = numpy.random.random_sample(total) < self.nanRate
+        inf = numpy.random.random_sample(total) < self.infRate
+        signals[nan] = float('nan')
+        infTotal = numpy.count_nonzero(inf)
+        signals[inf] = numpy.where(numpy.random.random_sample(infTotal) < 0.5,
+                                   float('+inf'), float('-inf'))
+        self.nanTotal += numpy.count_nonzero(nan)
+        self.infTotal += infTotal
+        return [struct.pack(str(nameSize)+'s', sample), signals.tostring()]
+
     def getSimBlock(self, sample, nameSize, signals, numberF=0):
         # convert sample name and list of floats to block of binary entries
         items = []
@@ -135,14 +181,20 @@ class simGenerator:
             samples.append(sample)
             calls = words[6:]
             callTotal = len(calls)
+            if self.table != None and len(self.table) != callTotal / 2:
+                inFile.close()
+                raise ValueError("Cluster table does not match .ped probe total")
             genotypes = []
             i = 0
             while i < len(calls):
+                if self.table != None: (baseX, baseY) = self.table.getAlleles(i/2)
+                elif self.index != None: (baseX, baseY) = self.index.getAlleles(i/2)
+                else: (baseX, baseY) = (self.baseX, self.baseY)
                 if calls[i]=='0': genotypes.append(self.NO_CALL)
-                elif calls[i]==self.baseX and calls[i+1]==self.baseY: genotypes.append(self.XY_CALL)
-                elif calls[i]==self.baseY and calls[i+1]==self.baseX: genotypes.append(self.XY_CALL)
-                elif calls[i]==self.baseX and calls[i+1]==self.baseX: genotypes.append(self.XX_CALL)
-                elif calls[i]==self.baseY and calls[i+1]==self.baseY: genotypes.append(self.YY_CALL)
+                elif calls[i]==baseX and calls[i+1]==baseY: genotypes.append(self.XY_CALL)
+                elif calls[i]==baseY and calls[i+1]==baseX: genotypes.append(self.XY_CALL)
+                elif calls[i]==baseX and calls[i+1]==baseX: genotypes.append(self.XX_CALL)
+                elif calls[i]==baseY and calls[i+1]==baseY: genotypes.append(self.YY_CALL)
                 else: 
                     sys.stderr.write("WARNING: Unknown genotype bases, sample "+sample+"\n")
                     genotypes.append(self.NO_CALL)
@@ -152,6 +204,49 @@ class simGenerator:
         probes = callTotal / 2
         return (results, samples, probes)
 
+    def generateClusters(self, probes, seed=None):
+        # generate per-probe cluster table; alleles from manifest if available
+        if self.index != None:
+            if len(self.index) != probes:
+                raise ValueError("Manifest does not match .ped probe total")
+            alleles = [self.index.getAlleles(i) for i in xrange(probes)]
+        else:
+            alleles = [(self.baseX, self.baseY)]*probes
+        self.importNumpy()
+        from clusterTable import clusterTable
+        self.table = clusterTable(self.noiseMean, self.noiseSD)
+        self.table.generateTable(alleles, seed, self.signalMean, self.signalSD,
+                                 names=self.snpNames)
+
+    def importNumpy(self):
+        # NumPy is required for cluster tables only
+        import numpy
+        self.numpy = numpy
+
+    def readClusters(self, inPath):
+        # if a manifest has been read, table must have the same probe total
+        self.importNumpy()
+        from clusterTable import clusterTable
+        self.table = clusterTable(self.noiseMean, self.noiseSD)
+        if self.index != None: self.table.readTable(inPath, len(self.index))
+        else: self.table.readTable(inPath)
+
+    def readManifest(self, inPath):
+        # read per-SNP alleles and names from manifest, for use in readPed
+        # and in the cluster table
+        self.index = manifestIndex()
+        self.snpNames = [snp[0] for snp in self.index.readSnps(inPath)]
+
+    def readSimHeader(self, inFile):
+        # read and check header of existing .sim file; return sample and probe totals
+        inFile.seek(0)
+        [magic, version, nameSize, samples, probes, channels, numberF] = \
+            struct.unpack('<3sBHIIBB', inFile.read(16))
+        if magic != 'sim' or nameSize != self.nameSize or \
+                channels != self.channels or numberF != 0:
+            raise ValueError("Incompatible .sim header: "+inFile.name)
+        return (samples, probes)
+
     def printNanInf(self):
         print "Total NaN:", self.nanTotal
         print "Total inf:", self.infTotal
@@ -161,21 +256,48 @@ class simGenerator:
         out = open(outPath, 'w')
         header = self.getSimHeader(self.nameSize, len(samples), probes)
         for field in header: out.write(field)
+        self.writeSimRows(out, results, samples)
+        out.close()
+
+    def writeSimRows(self, out, results, samples):
+        # write .sim data for each sample to open file
         for sample in samples:
             genotypes = results[sample]
+            if self.table != None:
+                genotypes = self.numpy.array(genotypes, self.numpy.intp)
+                intensities = self.table.getIntensities(genotypes,
+                                                        self.numpy.random,
+                                                        self.noCallNoise)
+                itemsBinary = self.getSimArrayBlock(sample, self.nameSize,
+                                                    intensities)
+                out.write(''.join(itemsBinary))
+                continue
             intensities = []
             for gt in genotypes:
                 intensities.extend(self.generateIntensity(gt))
             itemsBinary = self.getSimBlock(sample, self.nameSize, intensities)
             out.write(''.join(itemsBinary))
-        out.close()
-        
+
 
 gen = simGenerator()
-inPath = sys.argv[1]
-outPath = sys.argv[2]
+(opts, args) = getopt.gnu_getopt(sys.argv[1:], '',
+                                 ['append', 'clusters=', 'seed=', 'write_clusters='])
+opts = dict(opts)
+append = opts.has_key(gen.APPEND_FLAG)
+inPath = args[0]
+outPath = args[1]
+if len(args) > 2: gen.readManifest(args[2])
+if opts.has_key('--clusters'): gen.readClusters(opts['--clusters'])
 (results, samples, probes) = gen.readPed(inPath)
-gen.writeSim(outPath, results, samples, probes)
+if opts.has_key('--seed') and gen.table == None:
+    gen.generateClusters(probes, int(opts['--seed']))
+if gen.table != None and opts.has_key('--write_clusters'):
+    gen.table.writeTable(opts['--write_clusters'])
+if append:
+    total = gen.appendSim(outPath, results, samples, probes)
+    print "Appended samples to "+outPath+", new sample total: "+str(total)
+else:
+    gen.writeSim(outPath, results, samples, probes)
 gen.printNanInf()
 
 #for sample in samples: